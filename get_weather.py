@@ -2,33 +2,295 @@
 """
 Weather fetcher using wttr.in JSON API
 Uses only built-in Python libraries for portability
+(orjson is picked up for faster JSON parsing when it is installed)
 """
 
-import urllib.request
+import gzip
+import http.client
 import urllib.parse
 import json
+import logging
+import math
+import random
+import re
+import socket
 import sys
+import threading
 import time
 import os
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple, TypeVar
 
-# Force unbuffered output for Docker logs
-sys.stdout.reconfigure(line_buffering=True)
-sys.stderr.reconfigure(line_buffering=True)
+try:
+    import orjson
+    # Parses bytes directly, no separate UTF-8 decode step
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+T = TypeVar('T')
 
 # Debug mode - controlled by environment variable
-# Allows more detailed logging when enabled
+# Allows more detailed logging when enabled. Debug calls whose arguments cost
+# anything to build are wrapped in 'if DEBUG:' so production mode skips them
 DEBUG = os.getenv('DEBUG', '').lower() in ('true', '1', 'yes')
 
-def debug_print(message: str):
-    """Print debug message only if DEBUG mode is enabled"""
-    if DEBUG:
-        print(f"DEBUG: {message}")
+
+class _LogFormatter(logging.Formatter):
+    """Plain messages for Docker logs, with debug records prefixed 'DEBUG:'"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        if record.levelno == logging.DEBUG:
+            return f"DEBUG: {message}"
+        return message
+
+
+# Messages are only formatted when their level is enabled, and the handler
+# flushes stdout after each record
+logger = logging.getLogger(__name__)
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(_LogFormatter())
+logger.addHandler(_log_handler)
+logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+logger.propagate = False
+
+
+# Resolved addresses per (host, port). DNS is only consulted again after the
+# 5 minute TTL, or as soon as connecting to every cached address fails
+DNS_CACHE_TTL = 300
+_dns_cache: Dict[Tuple[str, int], Tuple[float, List[Tuple[str, int]]]] = {}
+
+
+def _resolve(host: str, port: int) -> List[Tuple[str, int]]:
+    """Resolve host to (ip, port) pairs, reusing a recent answer when there is one"""
+    cached = _dns_cache.get((host, port))
+    if cached and time.monotonic() - cached[0] < DNS_CACHE_TTL:
+        return cached[1]
+    
+    addresses = [sockaddr[:2] for *_, sockaddr in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    _dns_cache[(host, port)] = (time.monotonic(), addresses)
+    return addresses
+
+
+def _create_connection_cached(address: Tuple[str, int], timeout: Optional[float],
+                              source_address: Optional[Tuple[str, int]] = None) -> socket.socket:
+    """Drop-in for socket.create_connection that connects via the DNS cache"""
+    host, port = address
+    last_error: Optional[OSError] = None
+    for ip_address in _resolve(host, port):
+        try:
+            return socket.create_connection(ip_address, timeout, source_address)
+        except OSError as e:
+            last_error = e
+    
+    # Every cached address failed, resolve again next time
+    _dns_cache.pop((host, port), None)
+    raise last_error or OSError(f"No addresses found for {host}")
+
+
+# Default cities list
+DEFAULT_CITIES = [
+    "Nashville, TN",
+    "Los Gatos, CA", 
+    "San Francisco, CA",
+    "London, UK",
+    "Tokyo, JP",
+    "Rome, IT",
+    "Dublin, IE",
+    "New York City, NY",
+    "Seattle, WA",
+    "Paris, FR"
+]
+
+# One fetch worker per city, so a poll is a single wave bounded by the slowest city
+FETCH_WORKERS = len(DEFAULT_CITIES)
+
+# Idle keep-alive connections, keyed by (scheme, host:port), so repeated requests
+# to wttr.in and InfluxDB reuse one TCP/TLS session instead of reconnecting.
+# Sized to the fetch workers so a poll never opens connections it then discards
+HTTP_POOL_MAXSIZE = FETCH_WORKERS
+_http_pool: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+_http_pool_lock = threading.Lock()
+
+
+def _acquire_connection(scheme: str, netloc: str, timeout: float,
+                        reuse: bool = True) -> Tuple[http.client.HTTPConnection, bool]:
+    """Return an idle pooled connection for the host, or a new one, plus whether it was reused"""
+    if reuse:
+        with _http_pool_lock:
+            idle = _http_pool.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+    
+    if scheme == 'https':
+        conn = http.client.HTTPSConnection(netloc, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(netloc, timeout=timeout)
+    # HTTPConnection.connect() opens its socket through this hook
+    conn._create_connection = _create_connection_cached
+    return conn, False
+
+
+def _release_connection(scheme: str, netloc: str, conn: http.client.HTTPConnection):
+    """Return a connection to the pool, closing it if the pool for that host is full"""
+    with _http_pool_lock:
+        idle = _http_pool.setdefault((scheme, netloc), [])
+        if len(idle) < HTTP_POOL_MAXSIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+USER_AGENT = 'weather-fetcher/1.0'
+
+# Errors that mean a reused keep-alive connection was closed by the server while
+# idle. RemoteDisconnected covers an empty response to a request on such a socket
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def http_request(method: str, url: str, body: Optional[bytes] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 timeout: float = 10) -> Tuple[int, bytes, http.client.HTTPMessage]:
+    """
+    Send an HTTP request over a pooled keep-alive connection, accepting
+    gzip-compressed responses and decompressing them transparently
+    
+    Args:
+        method: HTTP method (GET, POST, ...)
+        url: Absolute http:// or https:// URL
+        body: Optional request body
+        headers: Optional extra request headers
+        timeout: Socket timeout in seconds, applied when the connection is opened
+    
+    Returns:
+        Tuple of (HTTP status code, decoded response body, response headers)
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    
+    # Explicit keep-alive so HTTP/1.0 proxies don't close the connection on us,
+    # and an identifying User-Agent since http.client doesn't send one
+    request_headers = {
+        'Connection': 'keep-alive',
+        'Accept-Encoding': 'gzip',
+        'User-Agent': USER_AGENT
+    }
+    if headers:
+        request_headers.update(headers)
+    
+    reuse = True
+    while True:
+        conn, reused = _acquire_connection(parts.scheme, parts.netloc, timeout, reuse=reuse)
+        try:
+            conn.request(method, path, body=body, headers=request_headers)
+            response = conn.getresponse()
+            data = response.read()
+            break
+        except (http.client.HTTPException, OSError) as error:
+            conn.close()
+            if reused and isinstance(error, _STALE_CONNECTION_ERRORS):
+                # The server dropped the idle connection, resend once on a new socket.
+                # Timeouts are not resent, the server may already have acted on the request
+                reuse = False
+                continue
+            raise
+    
+    if response.will_close:
+        conn.close()
+    else:
+        _release_connection(parts.scheme, parts.netloc, conn)
+    
+    if response.getheader('Content-Encoding', '').lower() in ('gzip', 'x-gzip'):
+        data = gzip.decompress(data)
+    return response.status, data, response.headers
+
+
+def jittered_backoff(seconds: float, cap: float = 30) -> float:
+    """Stretch a backoff delay by up to 50% at random, capped, so concurrent retries don't re-collide"""
+    return min(cap, seconds * (1 + random.random() * 0.5))
+
+
+def _classify_error(error: Exception) -> str:
+    """Short label for a failed attempt, used in retry messages"""
+    if isinstance(error, json.JSONDecodeError):
+        return "JSON decode error"
+    if isinstance(error, http.client.HTTPException):
+        return "HTTP error"
+    if isinstance(error, OSError):
+        return "connection error"
+    if isinstance(error, LookupError):
+        return "not available"
+    return "unexpected error"
+
+
+def _retry(fn: Callable[[], T], max_retries: int, backoff: Callable[[int], float], action: str) -> Optional[T]:
+    """
+    Call fn until it succeeds, sleeping with jittered backoff between attempts
+    
+    Args:
+        fn: Zero-argument callable; any exception counts as a failed attempt
+        max_retries: Maximum number of attempts
+        backoff: Maps the zero-based attempt number to a base delay in seconds
+        action: What fn does, for the final error message
+    
+    Returns:
+        The result of fn, or None if every attempt failed
+    """
+    for attempt in range(max_retries):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt < max_retries - 1:
+                wait_time = jittered_backoff(backoff(attempt))
+                logger.warning("Attempt %d failed - %s: %s", attempt + 1, _classify_error(e), e)
+                logger.warning("Retrying in %.1f seconds...", wait_time)
+                time.sleep(wait_time)
+            else:
+                logger.error("Error %s after %d attempts - %s: %s", action, max_retries, _classify_error(e), e)
+    
+    return None
+
+
+# wttr.in current conditions only refresh every 10-30 minutes, so successful
+# responses are reused for a while instead of re-fetching them on every poll.
+# A Cache-Control max-age on the response overrides this per entry
+def _weather_ttl_from_env(default: int = 300) -> int:
+    """WEATHER_TTL in seconds, falling back to the default when unset or invalid"""
+    raw = os.getenv('WEATHER_TTL', '').strip()
+    if not raw:
+        return default
+    try:
+        ttl = int(raw)
+    except ValueError:
+        ttl = -1
+    if ttl < 0:
+        logger.warning("Warning: Invalid WEATHER_TTL %r, using %d seconds", raw, default)
+        return default
+    return ttl
+
+
+WEATHER_CACHE_TTL = _weather_ttl_from_env()
+_weather_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+
+# wttr.in statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+def _max_age(cache_control: str) -> Optional[int]:
+    """Return the max-age from a Cache-Control header value, if it has one"""
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        if name.lower() == 'max-age' and value.isdigit():
+            return int(value)
+    return None
 
 
 def get_weather(location: str = "", format_type: str = "j1", max_retries: int = 3) -> Dict[str, Any]:
     """
-    Fetch weather data from wttr.in JSON API with retry logic
+    Fetch weather data from wttr.in JSON API with caching and retry logic
     
     Args:
         location: Location to get weather for (empty string for auto-detection)
@@ -38,6 +300,13 @@ def get_weather(location: str = "", format_type: str = "j1", max_retries: int =
     Returns:
         Dictionary containing weather data
     """
+    # Serve from cache when fresh, so retries only run on genuine misses
+    cache_key = (location, format_type)
+    cached = _weather_cache.get(cache_key)
+    if cached and time.monotonic() < cached[0]:
+        logger.debug("Using cached weather data for %s", location)
+        return cached[1]
+    
     # Encode location for URL
     encoded_location = urllib.parse.quote(location)
     
@@ -48,42 +317,24 @@ def get_weather(location: str = "", format_type: str = "j1", max_retries: int =
     else:
         url = f"{base_url}?format={format_type}"
     
-    for attempt in range(max_retries):
-        try:
-            # Make the request
-            with urllib.request.urlopen(url, timeout=10) as response:
-                data = response.read().decode('utf-8')
-                return json.loads(data)
+    def fetch() -> Dict[str, Any]:
+        status, data, headers = http_request('GET', url, timeout=10)
+        if status in RETRY_STATUSES:
+            raise http.client.HTTPException(f"HTTP {status}")
+        if status != 200:
+            # Client errors such as an unknown location won't fix themselves on retry
+            logger.error("✗ wttr.in returned HTTP %d for %s, not retrying", status, location)
+            return {}
         
-        except urllib.error.URLError as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
-                print(f"Attempt {attempt + 1} failed: {e}")
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                print(f"Error fetching weather data after {max_retries} attempts: {e}")
-                return {}
-        except json.JSONDecodeError as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"Attempt {attempt + 1} failed - JSON decode error: {e}")
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                print(f"Error parsing JSON response after {max_retries} attempts: {e}")
-                return {}
-        except Exception as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"Attempt {attempt + 1} failed - unexpected error: {e}")
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                print(f"Unexpected error after {max_retries} attempts: {e}")
-                return {}
-    
-    return {}
+        weather_data = json_loads(data)
+        if weather_data:
+            ttl = _max_age(headers.get('Cache-Control', ''))
+            ttl = WEATHER_CACHE_TTL if ttl is None else ttl
+            _weather_cache[cache_key] = (time.monotonic() + ttl, weather_data)
+        return weather_data
+    
+    # Exponential backoff: ~1s, 2s, 4s
+    return _retry(fetch, max_retries, lambda attempt: 2 ** attempt, "fetching weather data") or {}
 
 
 def format_current_weather(weather_data: Dict[str, Any]) -> str:
@@ -150,6 +401,13 @@ Visibility: {visibility} km
     return weather_info.strip()
 
 
+# Token env file shared via Docker volume
+TOKEN_FILE_PATH = "/tmp/extracted_token"
+
+# First INFLUXDB_TOKEN=... line of the env file, ignoring surrounding whitespace
+_TOKEN_LINE = re.compile(rb'^[ \t]*INFLUXDB_TOKEN=(.*?)[ \t\r]*$', re.MULTILINE)
+
+
 def get_influxdb_token() -> str:
     """
     Get InfluxDB token from mounted env file
@@ -158,85 +416,241 @@ def get_influxdb_token() -> str:
         InfluxDB token string, or empty string if not found
     """
     
-    debug_print("Attempting to get InfluxDB token...")
+    logger.debug("Attempting to get InfluxDB token...")
     
     # First try environment variable (in case it's set directly)
     token = os.getenv('INFLUXDB_TOKEN', '')
     
     if token:
-        print(f"✓ Found token in environment: {token[:10]}...{token[-4:] if len(token) > 14 else token}")
+        logger.info("✓ Found token in environment: %s...%s", token[:10], token[-4:] if len(token) > 14 else token)
         return token
     
     # Try to read from the mounted env file (shared via Docker volume)
-    token_file_path = "/tmp/extracted_token"
+    token_file_path = TOKEN_FILE_PATH
     
-    debug_print(f"Looking for token file at: {token_file_path}")
     if DEBUG:
-        print("DEBUG: Contents of /tmp/:")
+        logger.debug("Looking for token file at: %s", token_file_path)
+        logger.debug("Contents of /tmp/:")
         try:
-            for item in os.listdir('/tmp/'):
-                print(f"  - {item}")
+            with os.scandir('/tmp/') as entries:
+                for entry in entries:
+                    logger.debug("  - %s", entry.name)
         except Exception as e:
-            print(f"  Error listing /tmp/: {e}")
+            logger.debug("  Error listing /tmp/: %s", e)
     
     try:
-        if os.path.exists(token_file_path):
-            with open(token_file_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('INFLUXDB_TOKEN='):
-                        token = line.split('=', 1)[1]
-                        if token:
-                            print(f"✓ Found token in env file: {token[:10]}...{token[-4:] if len(token) > 14 else token}")
-                            return token
-                        break
-            print("✗ INFLUXDB_TOKEN not found in env file")
-        else:
-            print(f"✗ Token env file not found at {token_file_path}")
+        # The file is a single short line, one unbuffered read is enough
+        fd = os.open(token_file_path, os.O_RDONLY)
+        try:
+            match = _TOKEN_LINE.search(os.read(fd, 65536))
+        finally:
+            os.close(fd)
+        token = match.group(1).decode('utf-8') if match else ''
+        if token:
+            logger.info("✓ Found token in env file: %s...%s", token[:10], token[-4:] if len(token) > 14 else token)
+            return token
+        logger.error("✗ INFLUXDB_TOKEN not found in env file")
+    except FileNotFoundError:
+        logger.error("✗ Token env file not found at %s", token_file_path)
     except Exception as e:
-        print(f"✗ Error reading token env file: {e}")
+        logger.error("✗ Error reading token env file: %s", e)
     
     return ""
 
 
-def write_to_influxdb(weather_data: Dict[str, Any], location: str) -> bool:
+# Token read by ensure_token() and the token file mtime it was read at. It is
+# reused until the file changes or InfluxDB rejects it
+_token_cache = {'mtime': 0, 'token': ''}
+
+
+def _token_file_mtime() -> int:
+    """Modification time of the token file in nanoseconds, or 0 if it is missing"""
+    try:
+        return os.stat(TOKEN_FILE_PATH).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def ensure_token(max_token_retries: int = 5) -> str:
     """
-    Write weather data to InfluxDB using built-in libraries
+    Get the InfluxDB token, retrying until it is available, and memoize it
+    until the token file's mtime changes
     
     Args:
-        weather_data: Weather data from API
-        location: Location name for the measurement
+        max_token_retries: Maximum number of read attempts when not yet cached
     
     Returns:
-        True if successful, False otherwise
+        InfluxDB token string, or empty string if not found
     """
-    # Get InfluxDB configuration from environment variables
-    influxdb_url = os.getenv('INFLUXDB_URL', 'http://localhost:8086')
-    influxdb_org = os.getenv('INFLUXDB_ORG', 'nflx')
-    influxdb_bucket = os.getenv('INFLUXDB_BUCKET', 'default')
+    # One stat() per call instead of re-reading the file
+    if _token_cache['token'] and _token_file_mtime() == _token_cache['mtime']:
+        return _token_cache['token']
+    
+    def read_token() -> str:
+        # Take the mtime before reading, so a concurrent rewrite is seen next time
+        _token_cache['mtime'] = _token_file_mtime()
+        token = get_influxdb_token()
+        if not token:
+            raise LookupError("InfluxDB token not available yet")
+        return token
     
-    # Get token dynamically with retry logic
-    influxdb_token = ""
-    max_token_retries = 5
+    # Linear backoff: ~5s, 10s, 15s, 20s
+    token = _retry(read_token, max_token_retries, lambda attempt: 5 * (attempt + 1), "reading InfluxDB token")
+    if not token:
+        return ""
     
-    for attempt in range(max_token_retries):
-        debug_print(f"Token retrieval attempt {attempt + 1}/{max_token_retries}")
-        influxdb_token = get_influxdb_token()
-        if influxdb_token:
-            break
-        else:
-            if attempt < max_token_retries - 1:
-                wait_time = 5 * (attempt + 1)  # 5s, 10s, 15s, 20s
-                debug_print(f"Token retrieval failed, retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+    _token_cache['token'] = token
+    return token
+
+
+def invalidate_token():
+    """Forget the cached InfluxDB token so the next ensure_token() re-reads it"""
+    _token_cache['token'] = ''
+
+
+# On-disk copy of the token and weather cache, kept on the shared /tmp volume so a
+# restarted container skips the token retry loop and serves its first poll from cache
+STATE_PATH = os.getenv('WEATHER_STATE_PATH', '/tmp/weather_state.json')
+# Cache entries as of the last load or save, so unchanged polls skip the write
+_state_signature: Any = None
+
+
+def load_state():
+    """Read the state file and seed the token and weather caches from it"""
+    global _state_signature
+    try:
+        with open(STATE_PATH, 'rb') as f:
+            saved = json_loads(f.read())
+        
+        # The saved token is only trusted while the token file is unchanged,
+        # and never over an INFLUXDB_TOKEN env var, which get_influxdb_token prefers
+        mtime, token = saved.get('token', (0, ''))
+        if token and not os.getenv('INFLUXDB_TOKEN') and mtime == _token_file_mtime():
+            _token_cache.update(mtime=mtime, token=token)
+            logger.debug("Restored InfluxDB token from %s", STATE_PATH)
+        
+        # Weather entries carry a wall-clock expiry, converted back to monotonic time
+        now = time.time()
+        for key, value in saved.items():
+            if key.startswith('weather:'):
+                location, format_type, expires_at, weather_data = value
+                if expires_at > now:
+                    _weather_cache[(location, format_type)] = (time.monotonic() + expires_at - now, weather_data)
+                    logger.debug("Restored cached weather data for %s", location)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Warning: Ignoring unreadable state in %s: %s", STATE_PATH, e)
     
-    if not influxdb_token:
-        print("✗ Could not authenticate with InfluxDB after multiple attempts, skipping write to database")
-        return False
+    _state_signature = _cache_signature()
+
+
+def _cache_signature() -> Any:
+    """Identify the current token and weather cache entries without copying them"""
+    # A refetch always sets a new monotonic expiry, so expiries identify entries
+    return (_token_cache['mtime'], _token_cache['token'],
+            frozenset((key, entry[0]) for key, entry in _weather_cache.items()))
+
+
+def save_state():
+    """Rewrite the state file from the token and weather caches, if either changed"""
+    global _state_signature
+    signature = _cache_signature()
+    if signature == _state_signature:
+        return
+    
+    state: Dict[str, Any] = {}
+    # Only a token read from the file is persisted; its mtime is what proves it
+    # current on restart, and an INFLUXDB_TOKEN env var is re-read every start
+    if _token_cache['token'] and not os.getenv('INFLUXDB_TOKEN'):
+        state['token'] = (_token_cache['mtime'], _token_cache['token'])
+    
+    # Monotonic expiries don't survive a restart, so store wall-clock ones
+    now, now_monotonic = time.time(), time.monotonic()
+    for (location, format_type), (expires_at, weather_data) in _weather_cache.items():
+        if expires_at > now_monotonic:
+            state[f"weather:{format_type}:{location}"] = (location, format_type,
+                                                          now + expires_at - now_monotonic, weather_data)
+    
+    # Write an owner-only temp file and rename it over the old one, so the token
+    # isn't readable by other users of /tmp and a 'docker stop' mid-write never
+    # leaves a truncated state file behind
+    tmp_path = f"{STATE_PATH}.tmp"
+    try:
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, STATE_PATH)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning("Warning: Could not save state to %s: %s", STATE_PATH, e)
+        return
+    
+    _state_signature = signature
+
+
+# wttr.in current_condition fields written to InfluxDB, all as floats,
+# as (wttr.in key, line protocol template name) pairs
+FLOAT_FIELDS = (
+    ('temp_C', 'temp_c'), ('temp_F', 'temp_f'), ('humidity', 'humidity'),
+    ('pressure', 'pressure'), ('cloudcover', 'cloudcover'), ('windspeedKmph', 'wind_speed'),
+    ('visibility', 'visibility'), ('FeelsLikeC', 'feels_like_c'), ('FeelsLikeF', 'feels_like_f'),
+)
+
+
+# Line protocol tag escapes, applied in a single pass by str.translate
+_LP_ESCAPE = str.maketrans({' ': '\\ ', ',': '\\,', '=': '\\=', '"': '\\"'})
+
+
+def escape_tag_value(value: Any) -> str:
+    """Escape a tag value for InfluxDB line protocol, defaulting to 'Unknown'"""
+    if not value or value == 'Unknown':
+        return 'Unknown'
+    return str(value).translate(_LP_ESCAPE)
+
+
+# Measurement and escaped tags per (query, area name, country). These don't change
+# between polls, so each city's prefix is built once and reused
+_prefix_cache: Dict[Tuple[str, str, str], str] = {}
+
+
+def _line_protocol_prefix(location: str, location_name: str, country: str) -> str:
+    """Return the cached 'weather,<tags>' line protocol prefix for a city"""
+    key = (location, location_name, country)
+    prefix = _prefix_cache.get(key)
+    if prefix is None:
+        prefix = (f"weather,a_location={escape_tag_value(location_name)},"
+                  f"country={escape_tag_value(country)},query_location={escape_tag_value(location)}")
+        _prefix_cache[key] = prefix
+    return prefix
+
+
+# InfluxDB line protocol point - ALL values as floats (no 'i' suffix), with
+# fixed precision matching the data's real accuracy rather than full repr
+_LP_TEMPLATE = (
+    "%(prefix)s "
+    "temperature_celsius=%(temp_c).2f,temperature_fahrenheit=%(temp_f).2f,temperature_kelvin=%(temp_k).2f,"
+    "humidity=%(humidity).1f,pressure=%(pressure).1f,cloudcover=%(cloudcover).1f,"
+    "wind_speed_kmph=%(wind_speed).1f,visibility_km=%(visibility).1f,"
+    "feels_like_celsius=%(feels_like_c).2f,feels_like_fahrenheit=%(feels_like_f).2f,"
+    "latitude=%(lat).4f,longitude=%(lon).4f %(timestamp)d"
+)
+
+
+def build_line_protocol(weather_data: Dict[str, Any], location: str,
+                        timestamp: Optional[int] = None) -> Optional[str]:
+    """
+    Build an InfluxDB line protocol point from weather data (no I/O)
+    
+    Args:
+        weather_data: Weather data from API
+        location: Location name for the measurement
+        timestamp: Point time in nanoseconds since the epoch (defaults to now)
     
+    Returns:
+        Line protocol string, or None if the data is missing or invalid
+    """
     if not weather_data or 'current_condition' not in weather_data:
-        print("Warning: No weather data to write to InfluxDB")
-        return False
+        logger.warning("Warning: No weather data to write to InfluxDB for %s", location)
+        return None
     
     try:
         current = weather_data['current_condition'][0]
@@ -252,188 +666,210 @@ def write_to_influxdb(weather_data: Dict[str, Any], location: str) -> bool:
         try:
             lat_float = float(latitude) if latitude else 0.0
             lon_float = float(longitude) if longitude else 0.0
+            # NaN or inf would write 'latitude=nan' and fail the whole batch
+            if not (math.isfinite(lat_float) and math.isfinite(lon_float)):
+                raise ValueError("non-finite coordinate")
         except (ValueError, TypeError):
-            print(f"✗ Invalid latitude/longitude values for {location}: lat={latitude}, lon={longitude}")
+            logger.error("✗ Invalid latitude/longitude values for %s: lat=%s, lon=%s", location, latitude, longitude)
             lat_float = 0.0
             lon_float = 0.0
         
         # Convert ALL values to floats to avoid InfluxDB schema collisions
         if DEBUG:
-            print(f"DEBUG: Raw weather data for {location}:")
-            print(f"  temp_C: {current.get('temp_C', 'N/A')}")
-            print(f"  humidity: {current.get('humidity', 'N/A')}")
-            print(f"  pressure: {current.get('pressure', 'N/A')}")
-        
-        # Convert with better error handling
-        try:
-            temp_c = float(current.get('temp_C', 0)) if current.get('temp_C') else 0.0
-            temp_f = float(current.get('temp_F', 0)) if current.get('temp_F') else 0.0
-            temp_k = temp_c + 273.15 if temp_c != 0 else 273.15
-            humidity = float(current.get('humidity', 0)) if current.get('humidity') else 0.0
-            pressure = float(current.get('pressure', 0)) if current.get('pressure') else 0.0
-            cloudcover = float(current.get('cloudcover', 0)) if current.get('cloudcover') else 0.0
-            wind_speed = float(current.get('windspeedKmph', 0)) if current.get('windspeedKmph') else 0.0
-            visibility = float(current.get('visibility', 0)) if current.get('visibility') else 0.0
-            feels_like_c = float(current.get('FeelsLikeC', 0)) if current.get('FeelsLikeC') else 0.0
-            feels_like_f = float(current.get('FeelsLikeF', 0)) if current.get('FeelsLikeF') else 0.0
-            
-            # Validate that we don't have any NaN or infinite values
-            for name, value in [('temp_c', temp_c), ('temp_f', temp_f), ('temp_k', temp_k), 
-                              ('humidity', humidity), ('pressure', pressure), ('cloudcover', cloudcover),
-                              ('wind_speed', wind_speed), ('visibility', visibility), 
-                              ('feels_like_c', feels_like_c), ('feels_like_f', feels_like_f)]:
-                if not isinstance(value, (int, float)) or str(value).lower() in ['nan', 'inf', '-inf']:
-                    print(f"✗ Invalid numeric value for {name}: {value}")
-                    return False
-                    
-        except (ValueError, TypeError) as e:
-            print(f"✗ Error converting weather values to float for {location}: {e}")
-            return False
+            logger.debug("Raw weather data for %s:\n  temp_C: %s\n  humidity: %s\n  pressure: %s",
+                         location, current.get('temp_C', 'N/A'), current.get('humidity', 'N/A'),
+                         current.get('pressure', 'N/A'))
         
-        # Get current timestamp in nanoseconds
-        timestamp = int(time.time() * 1_000_000_000)
+        # Convert with better error handling, one lookup per field, and reject
+        # any NaN or infinite values
+        vals: Dict[str, Any] = {}
+        for key, name in FLOAT_FIELDS:
+            value = current.get(key)
+            try:
+                float_value = float(value) if value else 0.0
+            except (ValueError, TypeError) as e:
+                logger.error("✗ Error converting %s to float for %s: %s", key, location, e)
+                return None
+            if not math.isfinite(float_value):
+                logger.error("✗ Invalid numeric value for %s: %s", name, float_value)
+                return None
+            vals[name] = float_value
         
-        # Escape strings for InfluxDB line protocol (can't use backslashes in f-strings)
-        # More comprehensive escaping for InfluxDB line protocol
-        def escape_tag_value(value):
-            if not value or value == 'Unknown':
-                return 'Unknown'
-            return str(value).replace(' ', '\\ ').replace(',', '\\,').replace('=', '\\=').replace('"', '\\"')
+        vals['temp_k'] = vals['temp_c'] + 273.15
+        vals['lat'] = lat_float
+        vals['lon'] = lon_float
+        vals['timestamp'] = time.time_ns() if timestamp is None else timestamp
         
-        escaped_location = escape_tag_value(location_name)
-        escaped_country = escape_tag_value(country)
-        escaped_query = escape_tag_value(location)
+        # Escaped tags for InfluxDB line protocol
+        vals['prefix'] = _line_protocol_prefix(location, location_name, country)
         
-        # Create InfluxDB line protocol format - ALL values as floats (no 'i' suffix)
-        line_protocol = f"weather,a_location={escaped_location},country={escaped_country},query_location={escaped_query} temperature_celsius={temp_c},temperature_fahrenheit={temp_f},temperature_kelvin={temp_k},humidity={humidity},pressure={pressure},cloudcover={cloudcover},wind_speed_kmph={wind_speed},visibility_km={visibility},feels_like_celsius={feels_like_c},feels_like_fahrenheit={feels_like_f},latitude={lat_float},longitude={lon_float} {timestamp}"
+        # Create InfluxDB line protocol format
+        line_protocol = _LP_TEMPLATE % vals
         
         if DEBUG:
-            print(f"DEBUG: Line protocol for {location}:")
-            print(f"  {line_protocol[:200]}{'...' if len(line_protocol) > 200 else ''}")
+            logger.debug("Line protocol for %s:\n  %.200s%s", location, line_protocol,
+                         '...' if len(line_protocol) > 200 else '')
         
+        return line_protocol
+    
+    except ValueError as e:
+        logger.error("✗ Data conversion error for %s: %s", location, e)
+        return None
+    except Exception as e:
+        logger.error("✗ Unexpected error preparing InfluxDB data for %s: %s", location, e)
+        return None
+
+
+def flush_influxdb(lines: List[str]) -> bool:
+    """
+    Write a batch of line protocol points to InfluxDB in a single request
+    
+    Args:
+        lines: Line protocol strings, one point each
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    if not lines:
+        logger.warning("Warning: No weather data to write to InfluxDB")
+        return False
+    
+    # Get InfluxDB configuration from environment variables
+    influxdb_url = os.getenv('INFLUXDB_URL', 'http://localhost:8086')
+    influxdb_org = os.getenv('INFLUXDB_ORG', 'nflx')
+    influxdb_bucket = os.getenv('INFLUXDB_BUCKET', 'default')
+    
+    influxdb_token = ensure_token()
+    if not influxdb_token:
+        logger.error("✗ Could not authenticate with InfluxDB after multiple attempts, skipping write to database")
+        return False
+    
+    # Newline-separated points go to InfluxDB as one batch
+    payload = "\n".join(lines)
+    
+    try:
         # Prepare the HTTP request to InfluxDB
         write_url = f"{influxdb_url}/api/v2/write?org={influxdb_org}&bucket={influxdb_bucket}&precision=ns"
         
-        # Create the request
-        req = urllib.request.Request(
+        # Send the gzip-compressed batch over the pooled InfluxDB connection
+        status, error_body, _ = http_request(
+            'POST',
             write_url,
-            data=line_protocol.encode('utf-8'),
+            body=gzip.compress(payload.encode('utf-8')),
             headers={
                 'Authorization': f'Token {influxdb_token}',
-                'Content-Type': 'text/plain; charset=utf-8'
+                'Content-Type': 'text/plain; charset=utf-8',
+                'Content-Encoding': 'gzip'
             },
-            method='POST'
+            timeout=10
         )
         
-        # Send the request
-        with urllib.request.urlopen(req, timeout=10) as response:
-            if response.status == 204:
-                print(f"✓ Successfully wrote weather data for {location} to InfluxDB")
-                return True
-            else:
-                print(f"✗ Failed to write to InfluxDB: HTTP {response.status}")
-                return False
-                
-    except ValueError as e:
-        print(f"✗ Data conversion error for {location}: {e}")
-        return False
-    except urllib.error.HTTPError as e:
-        # Read the error response body for more details
-        error_body = e.read().decode('utf-8') if hasattr(e, 'read') else 'No error details'
-        print(f"✗ InfluxDB HTTP error for {location}: {e.code} {e.reason}")
-        print(f"✗ Error details: {error_body}")
-        print(f"✗ Line protocol being sent: {line_protocol}")
+        if status == 204:
+            logger.info("✓ Successfully wrote %d weather points to InfluxDB", len(lines))
+            return True
+        if status == 401:
+            # Token was rotated or revoked, re-read it on the next flush
+            invalidate_token()
+        
+        # Include the error response body for more details
+        logger.error("✗ InfluxDB HTTP error: %d", status)
+        logger.error("✗ Error details: %s", error_body.decode('utf-8', errors='replace') or 'No error details')
+        logger.error("✗ Line protocol being sent: %s", payload)
         return False
-    except urllib.error.URLError as e:
-        print(f"✗ InfluxDB connection error for {location}: {e}")
+    
+    except (http.client.HTTPException, OSError) as e:
+        logger.error("✗ InfluxDB connection error: %s", e)
         return False
     except Exception as e:
-        print(f"✗ Unexpected error writing to InfluxDB for {location}: {e}")
+        logger.error("✗ Unexpected error writing to InfluxDB: %s", e)
         return False
 
 
+# Seconds between the starts of consecutive polls
+POLL_INTERVAL = 30
+
+
 def main():
     """Main function to run the weather fetcher"""
-    print("Weather Fetcher using wttr.in API")
-    print("=" * 40)
-    
     # Display InfluxDB configuration
     influxdb_url = os.getenv('INFLUXDB_URL', 'http://localhost:8086')
     influxdb_org = os.getenv('INFLUXDB_ORG', 'nflx')
     influxdb_bucket = os.getenv('INFLUXDB_BUCKET', 'default')
-    influxdb_username = os.getenv('INFLUXDB_USERNAME', '')
-    influxdb_password = os.getenv('INFLUXDB_PASSWORD', '')
-    
-    print(f"InfluxDB URL: {influxdb_url}")
-    print(f"InfluxDB Org: {influxdb_org}")
-    print(f"InfluxDB Bucket: {influxdb_bucket}")
-    print(f"InfluxDB Auth: {'✓ Username/Password configured' if influxdb_username and influxdb_password else '✗ Missing credentials'}")
-    print("=" * 40)
-    
-    # Default cities list
-    default_cities = [
-        "Nashville, TN",
-        "Los Gatos, CA", 
-        "San Francisco, CA",
-        "London, UK",
-        "Tokyo, JP",
-        "Rome, IT",
-        "Dublin, IE",
-        "New York City, NY",
-        "Seattle, WA",
-        "Paris, FR"
-    ]
+    
+    # Multi-line blocks go out as one log record each, i.e. one write and flush
+    logger.info("Weather Fetcher using wttr.in API\n%s\nInfluxDB URL: %s\nInfluxDB Org: %s\nInfluxDB Bucket: %s\n%s",
+                "=" * 40, influxdb_url, influxdb_org, influxdb_bucket, "=" * 40)
     
     # Always use the hardcoded default cities
-    locations_to_fetch = default_cities
+    locations_to_fetch = DEFAULT_CITIES
     
     # Continuous polling loop
     poll_count = 1
     
+    # Pick up the token and weather cache saved by a previous run
+    load_state()
+    
+    # One worker pool for the life of the process, reused by every poll
+    executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+    
+    # Polls are scheduled against a monotonic deadline, so the cadence stays at
+    # POLL_INTERVAL instead of drifting by each poll's own duration
+    deadline = time.monotonic()
+    
     try:
         while True:
-            print(f"\n{'#'*80}")
-            print(f"WEATHER UPDATE #{poll_count}")
-            print(f"Time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"{'#'*80}")
+            logger.info("\n%s\nWEATHER UPDATE #%d\nTime: %s\n%s\n\nFetching weather for %d locations...",
+                        '#' * 80, poll_count, time.strftime('%Y-%m-%d %H:%M:%S'), '#' * 80,
+                        len(locations_to_fetch))
             
-            # Fetch and display weather for each location
-            for i, location in enumerate(locations_to_fetch):
+            # Fetch weather for all locations concurrently, the requests are independent I/O
+            results = list(executor.map(get_weather, locations_to_fetch))
+            
+            # Display each location and collect its point for one batched write,
+            # all points in a poll share one nanosecond timestamp
+            lines = []
+            timestamp = time.time_ns()
+            for i, (location, weather_data) in enumerate(zip(locations_to_fetch, results)):
+                parts = []
                 if len(locations_to_fetch) > 1:
-                    print(f"\n{'='*60}")
-                    print(f"Location {i+1} of {len(locations_to_fetch)}")
-                
-                print(f"\nFetching weather for: {location}")
-                print("Loading...")
-                
-                # Fetch weather data
-                weather_data = get_weather(location)
+                    parts.append(f"\n{'=' * 60}\nLocation {i + 1} of {len(locations_to_fetch)}")
+                parts.append(f"\nWeather for: {location}")
+                if weather_data:
+                    parts.append("\n" + format_current_weather(weather_data))
+                logger.info("\n".join(parts))
                 
                 if weather_data:
-                    print("\n" + format_current_weather(weather_data))
-                    
-                    # Write to InfluxDB
-                    write_success = write_to_influxdb(weather_data, location)
-                    if not write_success:
-                        print(f"Note: Weather data display successful but database write failed for {location}")
+                    line_protocol = build_line_protocol(weather_data, location, timestamp)
+                    if line_protocol:
+                        lines.append(line_protocol)
+                    else:
+                        logger.warning("Note: Weather data display successful but could not be prepared for the database for %s", location)
                 else:
-                    print(f"Failed to fetch weather data for {location}")
-                
-                # Add a small delay between requests to be respectful to the API
-                if i < len(locations_to_fetch) - 1:
-                    time.sleep(1)
+                    logger.warning("Failed to fetch weather data for %s", location)
+            
+            # Write all points to InfluxDB in a single request
+            if lines and not flush_influxdb(lines):
+                logger.warning("Note: Weather data display successful but database write failed for %d locations", len(lines))
+            
+            # Persist once per poll, after the fetches and the token read, and only on change
+            save_state()
             
             poll_count += 1
-            print(f"\n{'='*80}")
-            print("Waiting 30 seconds before next update...")
-            print(f"{'='*80}")
+            deadline += POLL_INTERVAL
+            sleep_for = deadline - time.monotonic()
+            if sleep_for <= 0:
+                # The poll overran its slot, start the next one now and reset the schedule
+                deadline = time.monotonic()
+                sleep_for = 0
+            
+            logger.info("\n%s\nWaiting %.1f seconds before next update...\n%s", '=' * 80, sleep_for, '=' * 80)
             
-            # Wait 30 seconds before next poll
-            time.sleep(30)
+            time.sleep(sleep_for)
             
     except KeyboardInterrupt:
-        print("\n\nShutting down weather fetcher...")
-        print("Goodbye!")
+        logger.info("\n\nShutting down weather fetcher...\nGoodbye!")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":